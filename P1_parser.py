@@ -18,7 +18,9 @@
 """
 
 import threading
-import copy
+import functools
+import itertools
+import queue
 import re
 import time
 import json
@@ -33,24 +35,54 @@ script = os.path.basename(__main__.__file__)
 script = os.path.splitext(script)[0]
 logger = logging.getLogger(script + "." + __name__)
 
+# Identifier (OBIS reference, eg "1-0:1.8.1") at the start of a telegram element
+_OBIS_REGEX = re.compile(r"(\d{0,3}-\d{0,3}:\d{0,3}\.\d{0,3}\.\d{0,3})")
+
+
+@functools.lru_cache(maxsize=None)
+def _element_decoder(index):
+  """
+  Prepare the dsmr50 definition of an OBIS reference for decoding
+  Evaluated once per OBIS reference; telegrams repeat the same references every time
+
+  Args:
+    :param str index: OBIS reference, eg "1-0:1.8.1"
+
+  Returns:
+    tuple: (compiled regex, cast, multiplication factor or None for str, mqtt tag, mqtt topic)
+  """
+  definition = dsmr.definition[index]
+
+  # .....this is normally "dangerous", as you can define any python function....but it is hardcoded
+  # in dsmr50.py file, which should be read-only for regular users
+  cast = eval(definition[dsmr.DATATYPE])
+
+  # multiplication factor for data, eg to convert kW to W
+  # If type is string, there is no multiplication factor
+  if definition[dsmr.DATATYPE] != "str":
+    multiply = cast(definition[dsmr.MULTIPLICATION])
+  else:
+    multiply = None
+
+  return (re.compile(definition[dsmr.REGEX]), cast, multiply,
+          str(definition[dsmr.MQTT_TAG]), str(definition[dsmr.MQTT_TOPIC]))
+
 
 class ParseTelegrams(threading.Thread):
   """
   """
 
-  def __init__(self, trigger, stopper, mqtt, telegram):
+  def __init__(self, telegrams, stopper, mqtt):
     """
     Args:
-      :param threading.Event() trigger: signals that new telegram is available
+      :param queue.SimpleQueue() telegrams: dsmr telegrams (tuple) from the serial reader
       :param threading.Event() stopper: stops thread
       :param mqtt.mqttclient() mqtt: reference to mqtt worker
-      :param list() telegram: dsmr telegram
     """
     logger.debug(">>")
     super().__init__()
-    self.__trigger = trigger
+    self.__telegrams = telegrams
     self.__stopper = stopper
-    self.__telegram = telegram
     self.__mqtt = mqtt
     self.__prev_ts = 0
 
@@ -68,7 +100,8 @@ class ParseTelegrams(threading.Thread):
     logger.debug(">>")
 
   def __publish_telegram(self, listofjsondicts):
-    # publish the dictionaries per topic
+    # publish the dictionaries per topic, all topics of the telegram in one call
+    messages = []
     for d in listofjsondicts:
       topic = d["topic"]
 
@@ -83,7 +116,9 @@ class ParseTelegrams(threading.Thread):
         # make resilient against double forward slashes in topic
         topic = topic.replace('//', '/')
         message = json.dumps(d, sort_keys=True, separators=(',', ':'))
-        self.__mqtt.do_publish(topic, message, retain=False)
+        messages.append((topic, message, False))
+
+    self.__mqtt.do_publish_many(messages)
     return
 
   def __decode_telegram_element(self, index, element, ts, listofjsondicts):
@@ -92,29 +127,22 @@ class ParseTelegrams(threading.Thread):
     try:
       # Extract result from telegram element, based on dsmr definition
       # Cast result to type defined in dsmr50
-      # .....this is normally "dangerous", as you can define any python function....but it is hardcoded
-      # in dsmr50.py file, which should be read-only for regular users
-      cast = dsmr.definition[index][dsmr.DATATYPE]
-      dsmr_data = re.match(dsmr.definition[index][dsmr.REGEX], element).group(1)
+      regex, cast, multiply, tag, topic = _element_decoder(index)
+      match = regex.match(element)
+      if match is None:
+        if logger.isEnabledFor(logging.DEBUG):
+          logger.debug(f"Element does not match dsmr definition: {element}")
+        return
 
-      # multiplication factor for data, eg to convert kW to W
-      multiply = dsmr.definition[index][dsmr.MULTIPLICATION]
+      dsmr_data = match.group(1)
 
       # dict & json pair
       # tag:data
       # If type is string, there is no multiplication factor
-      if cast != "str":
-        data = eval(cast)(dsmr_data) * eval(cast)(multiply)
+      if multiply is not None:
+        data = cast(dsmr_data) * multiply
       else:
-        data = eval(cast)(dsmr_data)
-        # logger.debug(f"CAST = {}")
-
-      # dict & json pair
-      # tag:data
-      tag = str(dsmr.definition[index][dsmr.MQTT_TAG])
-
-      # MQTT topic
-      topic = str(dsmr.definition[index][dsmr.MQTT_TOPIC])
+        data = cast(dsmr_data)
 
       # If topic does not exist yet, create & initialize dictionary for this topic;
       # Add tag:data pairs; which will be converted to mqtt json later on.
@@ -129,13 +157,13 @@ class ParseTelegrams(threading.Thread):
             dictionary[tag] = data
 
     except Exception as e:
-      logger.debug(f"Exception {e}")
-      pass
+      if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f"Exception {e}")
 
   def __decode_telegrams(self, telegram):
     """
     Args:
-      :param list telegram:
+      :param tuple telegram: first element is the telegram counter (int), followed by the telegram lines
 
     Returns:
 
@@ -154,22 +182,27 @@ class ParseTelegrams(threading.Thread):
     if (ts - self.__prev_ts) > self.__min_ts_interval:
       self.__prev_ts = ts
 
-      for element in telegram:
-        try:
-          # Extract the identifier (eg "1-0:1.8.1") of the element
-          # and use this as index for dsmr.definition
-          index = re.match(r"(\d{0,3}-\d{0,3}:\d{0,3}\.\d{0,3}\.\d{0,3}).*", element).group(1)
-          self.__decode_telegram_element(index, element, ts, listofjsondicts)
+      # Skip the telegram counter
+      for element in itertools.islice(telegram, 1, None):
+        # Extract the identifier (eg "1-0:1.8.1") of the element
+        # and use this as index for dsmr.definition
+        match = _OBIS_REGEX.match(element)
 
-        except Exception as e:
-          logger.debug(f"Exception {e}")
-          # To handle empty lines or lines not matching dsmr definitions (checksum, header, empty line)
-          pass
+        # Skip lines without identifier or not in dsmr definitions (header, checksum)
+        if match is None:
+          continue
 
-      logger.debug(f"DICT = {listofjsondicts}")
+        index = match.group(1)
+        if index not in dsmr.definition:
+          continue
+
+        self.__decode_telegram_element(index, element, ts, listofjsondicts)
+
+      if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f"DICT = {listofjsondicts}")
 
       self.__publish_telegram(listofjsondicts)
-    else:
+    elif logger.isEnabledFor(logging.DEBUG):
       logger.debug(f"Telegram is skipped; time elapsed since last MQTT message = {(ts - self.__prev_ts)}")
     return
 
@@ -177,18 +210,21 @@ class ParseTelegrams(threading.Thread):
     logger.debug(">>")
 
     while not self.__stopper.is_set():
-      # block till event is set, but implement timeout to allow stopper
-      self.__trigger.wait(timeout=1)
-      if self.__trigger.is_set():
-        # Make copy of the telegram, for further parsing
-        telegram = copy.deepcopy(self.__telegram)
-
-        # Clear telegram list for next capture by ReadSerial class
-        self.__telegram.clear()
-
-        # Clear trigger, serial can continue
-        self.__trigger.clear()
-
-        self.__decode_telegrams(telegram)
+      # block till telegram is available, but implement timeout to allow stopper
+      try:
+        telegram = self.__telegrams.get(timeout=1)
+      except queue.Empty:
+        continue
+
+      self.__decode_telegrams(telegram)
+
+    # Decode telegrams which are still queued (eg at simulator EOF)
+    while True:
+      try:
+        telegram = self.__telegrams.get_nowait()
+      except queue.Empty:
+        break
+
+      self.__decode_telegrams(telegram)
 
     logger.debug("<<")
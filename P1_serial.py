@@ -26,10 +26,11 @@ python3 -m serial.tools.miniterm /dev/ttyUSB0 115200 --xonxoff
         along with this program.  If not, see <http://www.gnu.org/licenses/>.
 """
 
+import itertools
+import mmap
 import serial
 import threading
 import time
-import re
 
 import config as cfg
 
@@ -41,24 +42,39 @@ script = os.path.basename(__main__.__file__)
 script = os.path.splitext(script)[0]
 logger = logging.getLogger(script + "." + __name__)
 
+# Tariff 1 & 2 electricity registers, eg 1-0:1.8.1(016230.132*kWh)
+# All four registers are "1-0:X.8.Y("; dispatch on the digits X and Y
+# (X, Y) --> 0: consumed, 1: returned
+_TARIFF_PREFIX = "1-0:"
+_TARIFF_REGISTERS = {("1", "1"): 0, ("1", "2"): 0,
+                     ("2", "1"): 1, ("2", "2"): 1}
+
+# The value is fixed width (NNNNNN.NNN) and directly follows the prefix
+_VALUE_SLICE = slice(10, 20)
+
 
 class TaskReadSerial(threading.Thread):
 
-  def __init__(self, trigger, stopper, telegram):
+  def __init__(self, telegrams, stopper):
     """
 
     Args:
-      :param threading.Event() trigger: signals that new telegram is available
+      :param queue.SimpleQueue() telegrams: each new dsmr telegram is put as tuple on this queue
       :param threading.Event() stopper: stops thread
-      :param list() telegram: dsmr telegram
     """
 
     logger.debug(">>")
     super().__init__()
-    self.__trigger = trigger
+    self.__telegrams = telegrams
     self.__stopper = stopper
-    self.__telegram = telegram
-    self.__counter = 0
+    self.__counter = itertools.count(1)
+
+    # Simulator only; memory mapped SIMULATORFILE and read position
+    self.__mm = None
+    self.__mm_pos = 0
+
+    # Simulator only; set at EOF. The stopper is set (in run) after the last telegram is queued
+    self.__eof = False
 
     # [ Serial parameters ]
     if cfg.PRODUCTION:
@@ -79,16 +95,25 @@ class TaskReadSerial(threading.Thread):
         logger.debug(f"serial {self.__tty.port} opened")
       else:
         self.__tty = open(cfg.SIMULATORFILE, 'rb')
+        try:
+          # Fails on an empty file
+          self.__mm = mmap.mmap(self.__tty.fileno(), 0, access=mmap.ACCESS_READ)
+        except Exception:
+          self.__tty.close()
+          raise
 
     except Exception as e:
       logger.error(f"ReadSerial: {type(e).__name__}: {str(e)}")
       self.__stopper.set()
-      raise ValueError('Cannot open P1 serial port', cfg.ser_port)
+      if cfg.PRODUCTION:
+        raise ValueError('Cannot open P1 serial port', cfg.ser_port)
+      else:
+        raise ValueError('Cannot open simulator file', cfg.SIMULATORFILE)
 
   def __del__(self):
     logger.debug(">>")
 
-  def __preprocess(self):
+  def __preprocess(self, telegram):
     """
       Add a virtual dsmr entry, which is sum of tariff 1 and tariff 2
 
@@ -100,53 +125,120 @@ class TaskReadSerial(threading.Thread):
       1-0:2.8.1(005998.736*kWh)
       1-0:2.8.2(015098.938*kWh)
 
+    Args:
+      :param list telegram: dsmr telegram; virtual entries are appended
+
     Returns:
       None
     """
 
-    e_consumed = 0.0
-    e_returned = 0.0
+    # [e_consumed, e_returned]
+    e_totals = [0.0, 0.0]
 
-    for element in self.__telegram:
-      try:
-        value = re.match(r"1-0:1\.8\.1\((\d{6}\.\d{3})\*kWh\)", element).group(1)
-        e_consumed = e_consumed + float(value)
-      except AttributeError:
-        pass
+    # Single pass over the telegram; stop when all four tariff registers are found
+    # A register that occurs more than once is only counted once (first occurrence)
+    # First element is the telegram counter
+    registers_found = set()
+    for element in itertools.islice(telegram, 1, None):
+      if not (element.startswith(_TARIFF_PREFIX) and element.startswith(".8.", 5) and element.startswith("(", 9)):
+        continue
 
-      try:
-        value = re.match(r"1-0:1\.8\.2\((\d{6}\.\d{3})\*kWh\)", element).group(1)
-        e_consumed = e_consumed + float(value)
-      except AttributeError:
-        pass
+      key = (element[4], element[8])
+      register = _TARIFF_REGISTERS.get(key)
+      if register is None or key in registers_found:
+        continue
 
       try:
-        value = re.match(r"1-0:2\.8\.1\((\d{6}\.\d{3})\*kWh\)", element).group(1)
-        e_returned = e_returned + float(value)
-      except AttributeError:
-        pass
+        e_totals[register] += float(element[_VALUE_SLICE])
+      except ValueError:
+        logger.debug(f"Cannot parse tariff register: {element}")
+        continue
 
-      try:
-        value = re.match(r"1-0:2\.8\.2\((\d{6}\.\d{3})\*kWh\)", element).group(1)
-        e_returned = e_returned + float(value)
-      except AttributeError:
-        pass
+      registers_found.add(key)
+      if len(registers_found) == len(_TARIFF_REGISTERS):
+        break
+
+    # No tariff registers (eg incomplete telegram); do not insert zero totals
+    if not registers_found:
+      return
 
     # Insert the virtual entries in the dsmr telegram
-    e_consumed = "{0:10.3f}".format(e_consumed)
-    line = f"1-0:1.8.3({e_consumed}*kWh)"
-    self.__telegram.append(line)
+    e_consumed, e_returned = e_totals
+    telegram.extend((f"1-0:1.8.3({e_consumed:10.3f}*kWh)",
+                     f"1-0:2.8.3({e_returned:10.3f}*kWh)"))
+
+  def __read_telegram(self):
+    """
+      Read one telegram up to, but not including, the closing "!<CRC>" line
+
+      In production, the telegram is read from the serial port with a single
+      read_until() call; the CRC line is consumed and discarded.
+      On a read timeout (meter silent or disconnected), the partial telegram is
+      discarded; the remainder will not arrive anymore.
+      Bytes before the last "/" header (eg a partial telegram when the port
+      is opened mid-telegram) are dropped; a telegram without header is discarded.
+      In non-production mode, the telegram is sliced from the memory mapped
+      SIMULATORFILE; detects EOF
 
-    e_returned = "{0:10.3f}".format(e_returned)
-    line = f"1-0:2.8.3({e_returned}*kWh)"
-    self.__telegram.append(line)
+    Returns:
+      bytes: raw telegram, or None if no complete telegram is available
+    """
+
+    if cfg.PRODUCTION:
+      raw = self.__tty.read_until(b"!")
+
+      # Read timeout; discard what has been received
+      if not raw.endswith(b"!"):
+        logger.debug(f"Timeout reading telegram; {len(raw)} bytes discarded")
+        return None
+
+      # Consume CRC and CR LF; not used
+      self.__tty.readline()
+
+      # Resync on the telegram header; without header the telegram is incomplete
+      start = raw.rfind(b"/")
+      if start == -1:
+        logger.debug(f"Telegram without header; {len(raw)} bytes discarded")
+        return None
+      if start > 0:
+        logger.debug(f"Incomplete telegram; {start} bytes discarded")
+        raw = raw[start:]
+
+      return raw[:-1]
+
+    mm = self.__mm
+    start = self.__mm_pos
+    end = mm.find(b"!", start)
+    if end == -1:
+      end = len(mm)
+
+    # Continue after the CRC line with the next telegram
+    eol = mm.find(b"\n", end)
+    self.__mm_pos = len(mm) if eol == -1 else eol + 1
+
+    raw = mm[start:end]
+
+    # Only in simulator mode; detect EOF in file
+    eof = raw.find(b"\nEOF")
+    if raw.startswith(b"EOF"):
+      eof = 0
+    if eof != -1 or self.__mm_pos >= len(mm):
+      self.__eof = True
+      logger.debug(f"EOF Detected in {cfg.SIMULATORFILE}")
+      if eof != -1:
+        raw = raw[:eof]
+
+    # Nothing left before EOF
+    if not raw.strip():
+      return None
+
+    return raw
 
   def __read_serial(self):
     """
       Opens & Closes serial port
-      Reads dsmr telegrams; stores in global variable (self.__telegram)
-      Sets threading event to signal other clients (parser) that
-      new telegram is available.
+      Reads dsmr telegrams; puts each telegram as tuple on the
+      telegrams queue for other clients (parser).
       In non-production mode, reads telegrams from file
 
     Returns:
@@ -154,40 +246,25 @@ class TaskReadSerial(threading.Thread):
     """
     logger.debug(">>")
 
-    while not self.__stopper.is_set():
+    while not (self.__stopper.is_set() or self.__eof):
 
-      # wait till parser has copied telegram content
-      # ...we need the opposite of trigger.wait()...block when set; not available
-      while self.__trigger.is_set():
-        time.sleep(0.1)
+      # Read the complete telegram at once
+      raw = self.__read_telegram()
+      if raw is None:
+        continue
 
-      # add a counter as first field to the list
-      self.__counter += 1
-      self.__telegram.append(f"{self.__counter}")
+      # add a counter (int) as first field to the list
+      telegram = [next(self.__counter)]
 
       # Decode from binary to ascii
-      # Remove CR LF
-      line = self.__tty.readline().decode('utf-8').rstrip()
-
-      # First element in telegram starts with "!"
-      nrof_elements = 0
-      while (not self.__stopper.is_set()) and (not line.startswith('!')):
-        self.__telegram.append(line)
-        line = self.__tty.readline().decode('utf-8').rstrip()
-        nrof_elements += 1
-#        logger.debug(f"TELEGRAM Element = {line}")
-
-        # Only in simulator mode; detect EOF in file
-        if (not cfg.PRODUCTION) and line.startswith('EOF'):
-          self.__stopper.set()
-          logger.debug(f"EOF Detected in {cfg.SIMULATORFILE}")
-          break
+      # Split on CR LF and skip empty lines
+      telegram.extend(line for line in raw.decode('ascii', errors='ignore').splitlines() if line)
 
       # do some magic on telegram
-      self.__preprocess()
+      self.__preprocess(telegram)
 
-      # Trigger that new telegram is available for MQTT
-      self.__trigger.set()
+      # Hand over the (immutable) telegram to the parser
+      self.__telegrams.put(tuple(telegram))
 
       # In simulation mode, insert a delay
       if not cfg.PRODUCTION:
@@ -207,6 +284,8 @@ class TaskReadSerial(threading.Thread):
       logger.error(f"Exception: {e}")
 
     finally:
+      if self.__mm is not None:
+        self.__mm.close()
       self.__tty.close()
       self.__stopper.set()
 
@@ -17,18 +17,24 @@
 import os
 from urllib.parse import urlparse
 
+# Single reference to os.environ; all settings below are read through it
+_env = os.environ
+
+# Values (lower case) that are interpreted as True in boolean environment variables
+_TRUE_VALUES = frozenset(('true', '1', 'yes', 'on'))
+
 
 def _get_bool_env(name, default):
     """Get boolean value from environment variable."""
-    value = os.environ.get(name)
+    value = _env.get(name)
     if value is None:
         return default
-    return value.lower() in ('true', '1', 'yes', 'on')
+    return value.lower() in _TRUE_VALUES
 
 
 def _get_int_env(name, default):
     """Get integer value from environment variable."""
-    value = os.environ.get(name)
+    value = _env.get(name)
     if value is None:
         return default
     try:
@@ -37,6 +43,15 @@ def _get_int_env(name, default):
         return default
 
 
+# Map MQTT URL scheme to transport and defaults
+_SCHEME_CONFIG = {
+    'mqtt': {'transport': 'tcp', 'default_port': 1883, 'use_tls': False},
+    'mqtts': {'transport': 'tcp', 'default_port': 8883, 'use_tls': True},
+    'ws': {'transport': 'websockets', 'default_port': 80, 'use_tls': False},
+    'wss': {'transport': 'websockets', 'default_port': 443, 'use_tls': True},
+}
+
+
 def _parse_mqtt_url(url):
     """
     Parse an MQTT URL and return connection parameters.
@@ -53,19 +68,11 @@ def _parse_mqtt_url(url):
     parsed = urlparse(url)
     scheme = parsed.scheme.lower()
 
-    # Map scheme to transport and defaults
-    scheme_config = {
-        'mqtt': {'transport': 'tcp', 'default_port': 1883, 'use_tls': False},
-        'mqtts': {'transport': 'tcp', 'default_port': 8883, 'use_tls': True},
-        'ws': {'transport': 'websockets', 'default_port': 80, 'use_tls': False},
-        'wss': {'transport': 'websockets', 'default_port': 443, 'use_tls': True},
-    }
-
-    if scheme not in scheme_config:
+    if scheme not in _SCHEME_CONFIG:
         raise ValueError(f"Unsupported MQTT URL scheme: {scheme}. "
                          f"Supported schemes: mqtt://, mqtts://, ws://, wss://")
 
-    config = scheme_config[scheme]
+    config = _SCHEME_CONFIG[scheme]
     host = parsed.hostname or '192.168.1.1'
     port = parsed.port or config['default_port']
     path = parsed.path if parsed.path else None
@@ -75,7 +82,7 @@ def _parse_mqtt_url(url):
 
 # [ LOGLEVELS ]
 # DEBUG, INFO, WARNING, ERROR, CRITICAL
-loglevel = os.environ.get("DSMR_LOGLEVEL", "INFO")
+loglevel = _env.get("DSMR_LOGLEVEL", "INFO")
 
 # [ PRODUCTION ]
 # True if run in production
@@ -87,7 +94,7 @@ PRODUCTION = _get_bool_env("DSMR_PRODUCTION", True)
 # tail -f /dev/ttyUSB0 > dsmr.raw (wait 10-15sec and hit ctrl-C)
 # (assuming that P1 USB is connected as ttyUSB0)
 # Add string "EOF" (without quotes) as last line
-SIMULATORFILE = os.environ.get("DSMR_SIMULATORFILE", "test/dsmr.raw")
+SIMULATORFILE = _env.get("DSMR_SIMULATORFILE", "test/dsmr.raw")
 
 # [ MQTT Parameters ]
 # MQTT_URL: Use URL-style configuration for MQTT connections
@@ -97,11 +104,11 @@ SIMULATORFILE = os.environ.get("DSMR_SIMULATORFILE", "test/dsmr.raw")
 # - ws://host:port/path - WebSocket connection (default port 80)
 # - wss://host:port/path - WebSocket Secure connection (default port 443)
 # If MQTT_URL is not set, MQTT_BROKER and MQTT_PORT are used for backward compatibility
-MQTT_URL = os.environ.get("MQTT_URL", "")
+MQTT_URL = _env.get("MQTT_URL", "")
 
 # Legacy broker configuration (used when MQTT_URL is not set)
 # Using local dns names is not always reliable with PAHO
-_MQTT_BROKER_DEFAULT = os.environ.get("MQTT_BROKER", "192.168.1.1")
+_MQTT_BROKER_DEFAULT = _env.get("MQTT_BROKER", "192.168.1.1")
 _MQTT_PORT_DEFAULT = _get_int_env("MQTT_PORT", 1883)
 
 # Parse MQTT URL or use legacy configuration
@@ -114,10 +121,10 @@ else:
     MQTT_USE_TLS = False
     MQTT_WS_PATH = None
 
-MQTT_CLIENT_UNIQ_ID = os.environ.get("MQTT_CLIENT_ID", "mqtt-dsmr")
+MQTT_CLIENT_UNIQ_ID = _env.get("MQTT_CLIENT_ID", "mqtt-dsmr")
 MQTT_QOS = _get_int_env("MQTT_QOS", 1)
-MQTT_USERNAME = os.environ.get("MQTT_USERNAME", "")
-MQTT_PASSWORD = os.environ.get("MQTT_PASSWORD", "")
+MQTT_USERNAME = _env.get("MQTT_USERNAME", "")
+MQTT_PASSWORD = _env.get("MQTT_PASSWORD", "")
 
 # MAX number of MQTT messages per hour. Assumption is that incoming messages are evenly spread in time
 # EXAMPLE 1: 1 per hour, 12: every 5min, 60: every 1min, 720; every 5sec, 3600: every 1sec
@@ -126,7 +133,7 @@ MQTT_PASSWORD = os.environ.get("MQTT_PASSWORD", "")
 MQTT_MAXRATE = _get_int_env("MQTT_MAXRATE", 60)
 
 # MQTT topic prefix
-MQTT_TOPIC_PREFIX = os.environ.get("MQTT_TOPIC_PREFIX", "dsmr")
+MQTT_TOPIC_PREFIX = _env.get("MQTT_TOPIC_PREFIX", "dsmr")
 
 if PRODUCTION:
     MQTT_CLIENT_UNIQ = MQTT_CLIENT_UNIQ_ID
@@ -138,6 +145,10 @@ else:
     MQTT_CLIENT_UNIQ = "mqtt-dsmr-test"
     HA_ID = "TEST"
 
+# Fixed topics derived from the (final) topic prefix
+MQTT_STATUS_TOPIC = f"{MQTT_TOPIC_PREFIX}/status"
+MQTT_SWVERSION_TOPIC = f"{MQTT_TOPIC_PREFIX}/sw-version"
+
 # [ Home Assistant ]
 HA_DISCOVERY = _get_bool_env("HA_DISCOVERY", True)
 
@@ -151,5 +162,5 @@ HA_DELETECONFIG = _get_bool_env("HA_DELETECONFIG", True)
 HA_DISCOVERY_RATE = _get_int_env("HA_DISCOVERY_RATE", 12)
 
 # [ P1 USB serial ]
-ser_port = os.environ.get("SERIAL_PORT", "/dev/ttyUSB0")
+ser_port = _env.get("SERIAL_PORT", "/dev/ttyUSB0")
 ser_baudrate = _get_int_env("SERIAL_BAUDRATE", 115200)
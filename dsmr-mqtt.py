@@ -33,9 +33,9 @@ __version__ = "4.0.2"
 __author__  = "Hans IJntema"
 __license__ = "GPLv3"
 
+import queue
 import signal
 import socket
-import time
 import sys
 import threading
 
@@ -53,20 +53,33 @@ logger.setLevel(cfg.loglevel)
 # status=1/FAILURE
 __exit_code = 1
 
-# ------------------------------------------------------------------------------------
-# Instance running?
-# ------------------------------------------------------------------------------------
 import os
 script=os.path.basename(__file__)
 script=os.path.splitext(script)[0]
 
-# Ensure that only one instance is started
-if sys.platform == "linux":
+# Abstract socket used as single instance lock; kept open for the lifetime of the process
+__lock_socket = None
+
+
+def _acquire_single_instance_lock():
+  """
+  Ensure that only one instance is started
+  Exits if another instance already holds the lock
+
+  Returns:
+    None
+  """
+  global __lock_socket
+
+  if sys.platform != "linux":
+    return
+
   lockfile = "\0" + script + "_lockfile"
   try:
     s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
     # Create an abstract socket, by prefixing it with null.
     s.bind(lockfile)
+    __lock_socket = s
     logger.info( f"Starting {__file__}; version = {__version__}" )
   except IOError as err:
     logger.info( f"{lockfile} already running. Exiting; {err}" )
@@ -88,35 +101,9 @@ def close():
 # ------------------------------------------------------------------------------------
 # LATE GLOBALS
 # ------------------------------------------------------------------------------------
-trigger = threading.Event()
 t_threads_stopper = threading.Event()
 t_mqtt_stopper = threading.Event()
 
-# mqtt thread
-t_mqtt = mqtt.MQTTClient(mqtt_broker=cfg.MQTT_BROKER,
-                         mqtt_port=cfg.MQTT_PORT,
-                         mqtt_client_id=cfg.MQTT_CLIENT_UNIQ,
-                         mqtt_qos=cfg.MQTT_QOS,
-                         mqtt_cleansession=True,
-                         mqtt_protocol=mqtt.MQTTv5,
-                         username=cfg.MQTT_USERNAME,
-                         password=cfg.MQTT_PASSWORD,
-                         mqtt_stopper=t_mqtt_stopper,
-                         worker_threads_stopper=t_threads_stopper,
-                         transport=cfg.MQTT_TRANSPORT,
-                         use_tls=cfg.MQTT_USE_TLS,
-                         ws_path=cfg.MQTT_WS_PATH)
-
-# SerialPort thread
-telegram = list()
-t_serial = p1.TaskReadSerial(trigger, t_threads_stopper, telegram)
-
-# Telegram parser thread
-t_parse = convert.ParseTelegrams(trigger, t_threads_stopper, t_mqtt, telegram)
-
-# Send Home Assistant auto discovery MQTT's
-t_discovery = ha.Discovery(t_threads_stopper, t_mqtt, __version__)
-
 
 def exit_gracefully(signal, stackframe):
   """
@@ -140,37 +127,73 @@ def exit_gracefully(signal, stackframe):
 def main():
   logger.debug(">>")
 
+  _acquire_single_instance_lock()
+
+  # Status topic is used for last will, online and offline status
+  status_topic = cfg.MQTT_STATUS_TOPIC
+
+  # Worker threads are created here and not at import; constructing them opens
+  # the P1 serial port and sets up the MQTT client
+  # mqtt thread
+  t_mqtt = mqtt.MQTTClient(mqtt_broker=cfg.MQTT_BROKER,
+                           mqtt_port=cfg.MQTT_PORT,
+                           mqtt_client_id=cfg.MQTT_CLIENT_UNIQ,
+                           mqtt_qos=cfg.MQTT_QOS,
+                           mqtt_cleansession=True,
+                           mqtt_protocol=mqtt.MQTTv5,
+                           username=cfg.MQTT_USERNAME,
+                           password=cfg.MQTT_PASSWORD,
+                           mqtt_stopper=t_mqtt_stopper,
+                           worker_threads_stopper=t_threads_stopper,
+                           transport=cfg.MQTT_TRANSPORT,
+                           use_tls=cfg.MQTT_USE_TLS,
+                           ws_path=cfg.MQTT_WS_PATH)
+
+  # SerialPort thread
+  telegrams = queue.SimpleQueue()
+  t_serial = p1.TaskReadSerial(telegrams, t_threads_stopper)
+
+  # Telegram parser thread
+  t_parse = convert.ParseTelegrams(telegrams, t_threads_stopper, t_mqtt)
+
+  # Send Home Assistant auto discovery MQTT's
+  t_discovery = ha.Discovery(t_threads_stopper, t_mqtt, __version__)
+
   logger.info(f"P1 serial port = {cfg.ser_port}")
   logger.info(f"MQTT Max Rate = {cfg.MQTT_MAXRATE}")
 
   # Set last will/testament
-  t_mqtt.will_set(cfg.MQTT_TOPIC_PREFIX + "/status", payload="offline", qos=cfg.MQTT_QOS, retain=True)
+  t_mqtt.will_set(status_topic, payload="offline", qos=cfg.MQTT_QOS, retain=True)
 
   # Start all threads
   t_mqtt.start()
-  # Introduce a small delay before starting the parsing, otherwise initial messages cannot be published
-  time.sleep(1)
+  # Wait till the MQTT client is connected before starting the parsing, otherwise initial messages cannot be published
+  if not t_mqtt.wait_connected(timeout=5):
+    logger.warning("No connection with MQTT broker yet; messages will be queued")
   t_parse.start()
   t_discovery.start()
   t_serial.start()
 
   # Set status to online
-  t_mqtt.set_status(cfg.MQTT_TOPIC_PREFIX + "/status", "online", retain=True)
+  t_mqtt.set_status(status_topic, "online", retain=True)
   logger.debug(f'Meter status set to online')
-  t_mqtt.do_publish(cfg.MQTT_TOPIC_PREFIX + "/sw-version", f"main={__version__}; mqtt={mqtt.__version__}", retain=True)
+  t_mqtt.do_publish(cfg.MQTT_SWVERSION_TOPIC, f"main={__version__}; mqtt={mqtt.__version__}", retain=True)
 
   # block till t_serial stops receiving telegrams/exits
   t_serial.join()
   logger.debug("t_serial.join exited; set stopper for other threats")
   t_threads_stopper.set()
 
+  # Parser publishes the remaining queued telegrams before it exits
+  t_parse.join()
+
   # Set status to offline
-  t_mqtt.set_status(cfg.MQTT_TOPIC_PREFIX + "/status", "offline", retain=True)
+  t_mqtt.set_status(status_topic, "offline", retain=True)
   logger.debug(f'Meter status set to offline')
 
-  # Todo check if MQTT queue is empty before setting stopper
-  # Use a simple delay of 1sec before closing mqtt
-  time.sleep(1)
+  # Flush queued MQTT messages before closing mqtt
+  if not t_mqtt.wait_queue_empty(timeout=5):
+    logger.warning("Not all MQTT messages have been published")
   t_mqtt_stopper.set()
 
   logger.debug("<<" )
@@ -182,6 +205,7 @@ def main():
 # ------------------------------------------------------------------------------------
 if __name__ == '__main__':
   logger.debug("__main__: >>")
+
   signal.signal(signal.SIGINT, exit_gracefully)
   signal.signal(signal.SIGTERM, exit_gracefully)
 
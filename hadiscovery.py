@@ -16,7 +16,6 @@ You should have received a copy of the GNU General Public License
 along with this program.  If not, see <http://www.gnu.org/licenses/>.
 """
 
-import time
 import threading
 import json
 import re
@@ -34,6 +33,21 @@ script = os.path.basename(__main__.__file__)
 script = os.path.splitext(script)[0]
 logger = logging.getLogger(script + "." + __name__)
 
+# Define here all the units that are measured by the meter and that are
+# supported in HA as available device classes
+# unit_of_measurement: (device_class, state_class); state_class None is not included
+# https://developers.home-assistant.io/docs/core/entity/sensor/#available-device-classes
+# https://www.home-assistant.io/integrations/sensor/
+# https://developers.home-assistant.io/docs/core/entity/sensor/#long-term-statistics
+_UNIT_CLASSES = {
+  "Wh": ("energy", "total"),
+  "W": ("power", None),           # state_class "measurement" not set
+  "A": ("current", None),         # state_class "measurement" not set
+  "V": ("voltage", None),         # state_class "measurement" not set
+  "m3": ("gas", "total"),
+  "m\u00b3": ("gas", "total"),
+}
+
 
 class Discovery(threading.Thread):
 
@@ -53,7 +67,6 @@ class Discovery(threading.Thread):
     self.__mqtt = mqtt
     self.__version = version
     self.__interval = 3600 / cfg.HA_DISCOVERY_RATE
-    self.__lastmqtt = 0
     self.__listofjsondicts = list()
 
   def __del__(self):
@@ -72,7 +85,7 @@ class Discovery(threading.Thread):
     logger.debug(f'LOGGER: create device JSON')
     d["name"] = "status"
     d["unique_id"] = "dsmr-device" + cfg.HA_ID
-    d["state_topic"] = cfg.MQTT_TOPIC_PREFIX + "/status"
+    d["state_topic"] = cfg.MQTT_STATUS_TOPIC
     d["icon"] = "mdi:home-automation"
     d["device"] = {"name": "DSMR P1" + cfg.HA_ID,
                    "sw_version": self.__version,
@@ -98,9 +111,12 @@ class Discovery(threading.Thread):
         # Create loop for telegram messages that will contain multiple values
         i = 0
 
+        # Number of values in the telegram message
+        nrof_groups = re.compile(regex).groups
+
         # Check if tag, description and regex contain equal amount of elements
-        if len(tag_matches) == len(description_matches) == re.compile(regex).groups:
-          while i < re.compile(regex).groups:
+        if len(tag_matches) == len(description_matches) == nrof_groups:
+          while i < nrof_groups:
             d = {}
             d["unique_id"] = tag_matches[i]
             d["state_topic"] = cfg.MQTT_TOPIC_PREFIX + "/" + dsmr.definition[index][dsmr.MQTT_TOPIC]
@@ -113,29 +129,16 @@ class Discovery(threading.Thread):
 
             d["value_template"] = "{{ value_json." + tag_matches[i] + " }}"
 
-            # Define here all the units that are measured by the meter and that are
-            # supported in HA as available device classes
-            # https://developers.home-assistant.io/docs/core/entity/sensor/#available-device-classes
-            # https://www.home-assistant.io/integrations/sensor/
-            # https://developers.home-assistant.io/docs/core/entity/sensor/#long-term-statistics
-            if d["unit_of_measurement"] == "Wh":
-              d["device_class"] = "energy"
-              d["state_class"] = "total"
-            elif d["unit_of_measurement"] == "W":
-              d["device_class"] = "power"
-#              d["state_class"] = "measurement"
-            elif d["unit_of_measurement"] == "A":
-              d["device_class"] = "current"
-#              d["state_class"] = "measurement"
-            elif d["unit_of_measurement"] == "V":
-              d["device_class"] = "voltage"
-#              d["state_class"] = "measurement"
-            elif d["unit_of_measurement"] == "m3" or d["unit_of_measurement"] == "m\u00b3":
-              d["device_class"] = "gas"
-              d["state_class"] = "total"
-
-              # Homeassistant expects m3 and not liters
-              d["value_template"] = "{{value_json." + tag_matches[i] + "|float/1000|round(0)" + "}}"
+            # Device class and state class for the unit of measurement (see _UNIT_CLASSES)
+            unit_classes = _UNIT_CLASSES.get(d["unit_of_measurement"])
+            if unit_classes is not None:
+              d["device_class"], state_class = unit_classes
+              if state_class is not None:
+                d["state_class"] = state_class
+
+              if d["device_class"] == "gas":
+                # Homeassistant expects m3 and not liters
+                d["value_template"] = "{{value_json." + tag_matches[i] + "|float/1000|round(0)" + "}}"
             else:
               logger.debug(f"Unknown unit_of_measurement = {d['unit_of_measurement']}")
 
@@ -166,17 +169,12 @@ class Discovery(threading.Thread):
     if cfg.HA_DISCOVERY:
       logger.info(f'Home Assistant config discovery is enabled')
       while not self.__stopper.is_set():
-        # calculate time elapsed since last MQTT
-        t_elapsed = int(time.time()) - self.__lastmqtt
-
-        if t_elapsed > self.__interval:
-          for _dict in self.__listofjsondicts:
-            topic = "homeassistant/sensor/" + cfg.MQTT_TOPIC_PREFIX + "/" + _dict["unique_id"] + "/config"
-            self.__mqtt.do_publish(topic, json.dumps(_dict, separators=(',', ':')), retain=True)
-            self.__lastmqtt = int(time.time())
-        else:
-          # wait...
-          time.sleep(0.5)
+        for _dict in self.__listofjsondicts:
+          topic = "homeassistant/sensor/" + cfg.MQTT_TOPIC_PREFIX + "/" + _dict["unique_id"] + "/config"
+          self.__mqtt.do_publish(topic, json.dumps(_dict, separators=(',', ':')), retain=True)
+
+        # Block till next discovery interval; returns immediately when stopper is set
+        self.__stopper.wait(timeout=self.__interval)
     else:
       logger.info(f'Home Assistant config discovery is DISABLED')
 
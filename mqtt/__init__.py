@@ -1,8 +1,18 @@
-from . mqtt import MQTTClient
-from paho.mqtt.client import MQTTv31
-from paho.mqtt.client import MQTTv311
-from paho.mqtt.client import MQTTv5
-
 __version__ = "2.0.0"
 __author__ = "Hans IJntema"
 __license__ = "GPLv3"
+
+__all__ = ["MQTTClient", "MQTTv31", "MQTTv311", "MQTTv5"]
+
+
+def __getattr__(name):
+  # paho-mqtt is imported on first use, not when the package is imported
+  if name == "MQTTClient":
+    from . mqtt import MQTTClient
+    return MQTTClient
+
+  if name in ("MQTTv31", "MQTTv311", "MQTTv5"):
+    from paho.mqtt import client
+    return getattr(client, name)
+
+  raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -61,6 +61,9 @@ script = os.path.basename(__main__.__file__)
 script = os.path.splitext(script)[0]
 logger = logging.getLogger(script + "." + __name__)
 
+# MQTT v5 requires paho-mqtt 1.5.1 or later; evaluated once at import
+_PAHO_SUPPORTS_V5 = Version(paho_mqtt.__version__) >= Version("1.5.1")
+
 # TODO
 # MQTT_ERR_NOMEM is not very accurate; is often similar to MQTT_ERR_CONN_LOST
 # eg stopping Mosquitto server generates a MQTT_ERR_NOMEM
@@ -82,7 +85,12 @@ class MQTTClient(threading.Thread):
                worker_threads_stopper=None,
                transport="tcp",
                use_tls=False,
-               ws_path=None):
+               ws_path=None,
+               tcp_nodelay=True,
+               max_queued=4096,
+               sndbuf=None,
+               rcvbuf=None,
+               cpu_affinity=None):
 
     """
     Args:
@@ -102,6 +110,13 @@ class MQTTClient(threading.Thread):
       :param str transport: "tcp" or "websockets"
       :param bool use_tls: Enable TLS/SSL for the connection
       :param str ws_path: WebSocket path (only used when transport="websockets")
+      :param bool tcp_nodelay: Disable Nagle's algorithm, small messages are sent without delay
+      :param int max_queued: Max number of messages in the outgoing queue (0 = unlimited);
+      bounds memory usage when the broker is unreachable for a long time
+      :param int sndbuf: socket send buffer size in bytes (SO_SNDBUF); None keeps the OS default
+      :param int rcvbuf: socket receive buffer size in bytes (SO_RCVBUF); None keeps the OS default
+      Setting a buffer size disables the kernel's automatic buffer tuning for that socket
+      :param set cpu_affinity: CPU numbers to pin the paho network thread to (Linux only); None does not pin
 
     Returns:
       None
@@ -110,168 +125,203 @@ class MQTTClient(threading.Thread):
     logger.info(f">> paho-mqtt version = {paho_mqtt.__version__}")
     super().__init__()
 
-    self.__mqtt_broker = mqtt_broker
-    self.__mqtt_stopper = mqtt_stopper
-    self.__mqtt_port = mqtt_port
-    self.__transport = transport
-    self.__use_tls = use_tls
-    self.__ws_path = ws_path
+    self._mqtt_broker = mqtt_broker
+    self._mqtt_stopper = mqtt_stopper
+    self._mqtt_port = mqtt_port
+    self._transport = transport
+    self._use_tls = use_tls
+    self._ws_path = ws_path
+    self._tcp_nodelay = tcp_nodelay
+    self._max_queued = max_queued
+    self._sndbuf = sndbuf
+    self._rcvbuf = rcvbuf
+    self._cpu_affinity = cpu_affinity
+
+    # Set when the paho network thread has been pinned to cpu_affinity
+    self._affinity_set = False
 
     # Generate random client id if not specified;
     # Basename ('script', from log module) and extended with 10 random characters
     if mqtt_client_id is None:
-      self.__mqtt_client_id = script + '_' + ''.join(random.choice(string.ascii_lowercase) for _i in range(10))
+      self._mqtt_client_id = script + '_' + ''.join(random.choices(string.ascii_lowercase, k=10))
     else:
-      self.__mqtt_client_id = mqtt_client_id
+      self._mqtt_client_id = mqtt_client_id
 
-    logger.info(f"MQTT Client ID = {self.__mqtt_client_id}")
-    logger.info(f"MQTT Transport = {self.__transport}, TLS = {self.__use_tls}")
+    logger.info(f"MQTT Client ID = {self._mqtt_client_id}")
+    logger.info(f"MQTT Transport = {self._transport}, TLS = {self._use_tls}")
 
-    self.__qos = mqtt_qos
-    self.__mqtt_cleansession = mqtt_cleansession
-    self.__mqtt_protocol = mqtt_protocol
+    self._qos = mqtt_qos
+    self._mqtt_cleansession = mqtt_cleansession
+    self._mqtt_protocol = mqtt_protocol
 
     if worker_threads_stopper is None:
-      self.__worker_threads_stopper = self.__mqtt_stopper
+      self._worker_threads_stopper = self._mqtt_stopper
     else:
-      self.__worker_threads_stopper = worker_threads_stopper
+      self._worker_threads_stopper = worker_threads_stopper
 
     # Check if installed paho-mqtt version supports MQTT v5
     # Demote to v311 if wrong version is installed
-    if self.__mqtt_protocol == mqtt_client.MQTTv5:
-      if Version(f"{paho_mqtt.__version__}") < Version("1.5.1"):
-        logger.warning(f"Incorrect paho-mqtt version ({paho_mqtt.__version__}) to support MQTT v5, "
-                       f"reverting to MQTT v311")
-        self.__mqtt_protocol = mqtt_client.MQTTv311
+    if self._mqtt_protocol == mqtt_client.MQTTv5 and not _PAHO_SUPPORTS_V5:
+      logger.warning(f"Incorrect paho-mqtt version ({paho_mqtt.__version__}) to support MQTT v5, "
+                     f"reverting to MQTT v311")
+      self._mqtt_protocol = mqtt_client.MQTTv311
+
+    # MQTT v3.1 or v3.1.1; determines clean session and callback handling
+    self._is_v3 = self._mqtt_protocol in (mqtt_client.MQTTv311, mqtt_client.MQTTv31)
 
     # clean_session is only implemented for MQTT v3
-    if self.__mqtt_protocol == mqtt_client.MQTTv311 or self.__mqtt_protocol == mqtt_client.MQTTv31:
-      self.__mqtt = mqtt_client.Client(
+    if self._is_v3:
+      self._mqtt = mqtt_client.Client(
           callback_api_version=mqtt_client.CallbackAPIVersion.VERSION2,
-          client_id=self.__mqtt_client_id,
+          client_id=self._mqtt_client_id,
           clean_session=mqtt_cleansession,
-          protocol=self.__mqtt_protocol,
-          transport=self.__transport)
-    elif self.__mqtt_protocol == mqtt_client.MQTTv5:
-      self.__mqtt = mqtt_client.Client(
+          protocol=self._mqtt_protocol,
+          transport=self._transport)
+    elif self._mqtt_protocol == mqtt_client.MQTTv5:
+      self._mqtt = mqtt_client.Client(
           callback_api_version=mqtt_client.CallbackAPIVersion.VERSION2,
-          client_id=self.__mqtt_client_id,
-          protocol=self.__mqtt_protocol,
-          transport=self.__transport)
+          client_id=self._mqtt_client_id,
+          protocol=self._mqtt_protocol,
+          transport=self._transport)
     else:
       logger.error(f"Unknown MQTT protocol version {mqtt_protocol}....exit")
-      self.__worker_threads_stopper.set()
-      self.__mqtt_stopper.set()
+      self._worker_threads_stopper.set()
+      self._mqtt_stopper.set()
       return
 
     # Configure TLS if enabled
-    if self.__use_tls:
-      self.__mqtt.tls_set(cert_reqs=ssl.CERT_REQUIRED)
+    if self._use_tls:
+      self._mqtt.tls_set(cert_reqs=ssl.CERT_REQUIRED)
       logger.info("TLS enabled for MQTT connection")
 
     # Configure WebSocket path if using websockets transport
-    if self.__transport == "websockets" and self.__ws_path:
-      self.__mqtt.ws_set_options(path=self.__ws_path)
-      logger.info(f"WebSocket path set to: {self.__ws_path}")
+    if self._transport == "websockets" and self._ws_path:
+      self._mqtt.ws_set_options(path=self._ws_path)
+      logger.info(f"WebSocket path set to: {self._ws_path}")
 
     # Indicate whether thread has started - run() has been called
-    self.__run = False
+    self._run = False
 
     # Todo parameterize
-    self.__keepalive = 600
+    self._keepalive = 600
 
     # MQTT client tries to force a reconnection if
     # Client remains disconnected for more than MQTT_CONNECTION_TIMEOUT seconds
-    self.__MQTT_CONNECTION_TIMEOUT = 60
+    self._MQTT_CONNECTION_TIMEOUT = 60
+
+    # Client and worker threads are stopped if there is no connection with the broker
+    # within MQTT_GIVEUP_TIMEOUT seconds after start
+    self._MQTT_GIVEUP_TIMEOUT = 3600
+    self._start_time = time.monotonic()
+
+    # Set after first successful connection with the broker
+    self._connected_once = False
 
     # Call back functions
-    self.__mqtt.on_connect = self.__on_connect
-    self.__mqtt.on_disconnect = self.__on_disconnect
-    self.__mqtt.on_message = self.__on_message
+    self._mqtt.on_connect = self._on_connect
+    self._mqtt.on_connect_fail = self._on_connect_fail
+    self._mqtt.on_disconnect = self._on_disconnect
+    self._mqtt.on_message = self._on_message
+    self._mqtt.on_socket_open = self._on_socket_open
+
+    # Counts messages that have been handed over to the broker
+    self._mqtt.on_publish = self._on_publish
 
     # Uncomment if needed for debugging
-#    self.__mqtt.on_publish = self.__on_publish
-#    self.__mqtt.on_log = self.__on_log
+#    self._mqtt.on_log = self._on_log
 
-    if self.__mqtt_protocol == mqtt_client.MQTTv311 or self.__mqtt_protocol == mqtt_client.MQTTv31:
-      self.__mqtt.on_subscribe = self.__on_subscribe_v31
-    elif self.__mqtt_protocol == mqtt_client.MQTTv5:
-      self.__mqtt.on_subscribe = self.__on_subscribe_v5
+    if self._is_v3:
+      self._mqtt.on_subscribe = self._on_subscribe_v31
+    elif self._mqtt_protocol == mqtt_client.MQTTv5:
+      self._mqtt.on_subscribe = self._on_subscribe_v5
     else:
-      self.__mqtt.on_subscribe = None
+      self._mqtt.on_subscribe = None
 
-    self.__mqtt.on_unsubscribe = self.__on_unsubscribe
+    self._mqtt.on_unsubscribe = self._on_unsubscribe
 
     # Not yet implemented
-    # self.__mqtt.on_unsubscribe = self.__on_unsubscribe
+    # self._mqtt.on_unsubscribe = self._on_unsubscribe
 
-    # Managed via __set_connected_flag()
+    # Managed via _set_connected_flag()
     # Keeps track of connected status
-    self.__connected_flag = False
+    self._connected_flag = False
+    self._connected_event = threading.Event()
 
     # Keep track how long client is disconnected
     # When threshold is exceeded, try to recover
     # In some cases, a MQTT_ERR_NOMEM is not recovered automatically
-    self.__disconnect_start_time = int(time.time())
+    self._disconnect_start_time = time.monotonic()
 
-    # Maintain a mqtt message count
-    self.__mqtt_counter = 0
+    # Maintain a mqtt message count; incremented in on_publish, when message is sent to the broker
+    self._mqtt_counter = 0
 
-    self.__mqtt.username_pw_set(username, password)
+    # MQTTMessageInfo of last published message; used to check if queue has been flushed
+    self._last_messageinfo = None
+
+    # mid of the last message that has been sent to the broker; set in on_publish
+    self._published_mid = None
+    self._published_condition = threading.Condition()
+
+    # Number of messages dropped because the outgoing queue was full
+    # Only the first drop of a series is logged
+    self._mqtt_dropped = 0
+    self._queue_full = False
+
+    self._mqtt.username_pw_set(username, password)
 
     # status topic & message
-    self.__status_topic = None
-    self.__status_payload = None
-    self.__status_retain = None
+    self._status_topic = None
+    self._status_payload = None
+    self._status_retain = None
 
     #######
     # Trigger to clients/threads to indicate that message is received and stored in queue
-    self.__message_trigger = None
+    self._message_trigger = None
 
     # Queue to store received subscribed messages
-    self.__subscribed_queue = None
+    self._subscribed_queue = None
 
-    # list of subscribed topics
-    self.__list_of_subscribed_topics = []
+    # Subscribed topics (for resubscribing when reconnecting)
+    # dict is used as an insertion ordered set; values are not used
+    self._subscribed_topics = {}
 
   def __del__(self):
     logger.debug(f">>")
-    logger.info(f"Shutting down MQTT Client... {self.__mqtt_counter} MQTT messages have been published")
+    logger.info(f"Shutting down MQTT Client... {self._mqtt_counter} MQTT messages have been published")
 
-  def __internet_on(self):
+  def _check_connection_giveup(self):
     """
-      Test if there is connectivity with the MQTT broker
+    Stop the client and worker threads when no connection with the MQTT broker
+    could be established within MQTT_GIVEUP_TIMEOUT seconds after start
 
     Returns:
-      return: connectivity status (True, False)
-      rtype: bool
+      None
     """
-    logger.debug(f">>")
+    if self._connected_once:
+      return
 
-    s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    try:
-      # Format: s.connect((HOST, PORT))
-      s.connect((f"{self.__mqtt_broker}", int(self.__mqtt_port)))
-      s.shutdown(socket.SHUT_RDWR)
-      logger.debug(f"Internet connectivity to MQTT broker {self.__mqtt_broker} at port {self.__mqtt_port} available")
-      return True
-    except Exception as e:
-      logger.info(f"Internet connectivity to MQTT broker {self.__mqtt_broker} at port {self.__mqtt_port} "
-                  f"NOT yet available; Exception {e}")
-      return False
+    if time.monotonic() - self._start_time > self._MQTT_GIVEUP_TIMEOUT:
+      logger.error(f"No connection with MQTT broker {self._mqtt_broker} at port {self._mqtt_port} - EXIT")
+      self._mqtt_stopper.set()
+      self._worker_threads_stopper.set()
 
-  def __set_connected_flag(self, flag=True):
-    logger.debug(f">> flag={flag}; current __connected_flag={self.__connected_flag}")
+  def _set_connected_flag(self, flag=True):
+    logger.debug(f">> flag={flag}; current _connected_flag={self._connected_flag}")
 
-    # if flag == False and __connected_flag == True; start trigger
-    if not flag and self.__connected_flag:
-      self.__disconnect_start_time = int(time.time())
+    # if flag == False and _connected_flag == True; start trigger
+    if not flag and self._connected_flag:
+      self._disconnect_start_time = time.monotonic()
       logger.debug("Disconnect TIMER started")
 
-    self.__connected_flag = flag
+    self._connected_flag = flag
+
+    if flag:
+      self._connected_event.set()
+    else:
+      self._connected_event.clear()
     return
 
-  def __on_connect(self, _client, userdata, connect_flags, reason_code, _properties=None):
+  def _on_connect(self, _client, userdata, connect_flags, reason_code, _properties=None):
     """
     Callback: when the client receives a CONNACK response from the broker.
 
@@ -287,20 +337,47 @@ class MQTTClient(threading.Thread):
       None
     """
     logger.debug(f">>")
+
+    # Pin the paho network thread to the configured CPUs, once
+    # The CONNACK is always handled by the network loop thread; on_socket_open is not
+    # suitable, as it runs in the MQTTClient thread when run() forces a reconnect
+    # pid 0 refers to the calling thread
+    if self._cpu_affinity is not None and not self._affinity_set and hasattr(os, "sched_setaffinity"):
+      self._affinity_set = True
+      try:
+        os.sched_setaffinity(0, self._cpu_affinity)
+      except OSError as e:
+        logger.warning(f"Cannot set CPU affinity {self._cpu_affinity}; Exception {e}")
+
     if reason_code.is_failure:
       logger.error(f"userdata={userdata}; flags={connect_flags}; reason_code={reason_code}")
-      self.__set_connected_flag(False)
+      self._set_connected_flag(False)
+      self._check_connection_giveup()
     else:
       logger.debug(f"Connected: userdata={userdata}; flags={connect_flags}; reason_code={reason_code}")
-      self.__set_connected_flag(True)
-      self.__set_status()
+      self._connected_once = True
+      self._set_connected_flag(True)
+      self._set_status()
 
       # Re-subscribe, in case connection was lost
-      for topic in self.__list_of_subscribed_topics:
-        logger.debug(f"Resubscribe topic: {topic}")
-        self.__mqtt.subscribe(topic, self.__qos)
+      self._resubscribe_all()
 
-  def __on_disconnect(self, _client, userdata, disconnect_flags, reason_code, _properties=None):
+  def _on_connect_fail(self, _client, _userdata):
+    """
+    Callback: when the network loop failed to connect to the broker.
+    paho retries with the delays set by reconnect_delay_set()
+
+    Args:
+      :param ? _client: the client instance for this callback
+      :param ? _userdata: the private user data as set in Client()
+
+    Returns:
+      None
+    """
+    logger.info(f"Connection to MQTT broker {self._mqtt_broker} at port {self._mqtt_port} failed; retrying")
+    self._check_connection_giveup()
+
+  def _on_disconnect(self, _client, userdata, disconnect_flags, reason_code, _properties=None):
     """
     Callback: called when the client disconnects from the broker.
 
@@ -320,25 +397,55 @@ class MQTTClient(threading.Thread):
     else:
       logger.info(f"Expected disconnect, userdata = {userdata}; reason_code = {reason_code}")
 
-    self.__set_connected_flag(False)
+    self._set_connected_flag(False)
     return
 
-  def __on_message(self, _client, _userdata, message):
+  def _on_socket_open(self, _client, _userdata, sock):
+    """
+    Callback: when the socket to the broker has been opened, before the MQTT connect is sent.
+
+    Args:
+      :param ? _client: the client instance for this callback
+      :param ? _userdata: the private user data as set in Client()
+      :param socket sock: the socket which was just opened
+
+    Returns:
+      None
+    """
+    # With websockets transport, paho wraps the TCP socket
+    sock = getattr(sock, "_socket", sock)
+
+    options = []
+    if self._tcp_nodelay:
+      options.append(("TCP_NODELAY", socket.IPPROTO_TCP, socket.TCP_NODELAY, 1))
+    if self._sndbuf is not None:
+      options.append(("SO_SNDBUF", socket.SOL_SOCKET, socket.SO_SNDBUF, self._sndbuf))
+    if self._rcvbuf is not None:
+      options.append(("SO_RCVBUF", socket.SOL_SOCKET, socket.SO_RCVBUF, self._rcvbuf))
+
+    for name, level, option, value in options:
+      try:
+        sock.setsockopt(level, option, value)
+      except OSError as e:
+        logger.warning(f"Cannot set {name} on MQTT socket; Exception {e}")
+
+  def _on_message(self, _client, _userdata, message):
     """
     :param _client:
     :param _userdata:
-    :param message: Queue()
+    :param message: MQTTMessage
     :return:
     """
-    logger.debug(f">> message = {message.topic}  {message.payload}")
+    if logger.isEnabledFor(logging.DEBUG):
+      logger.debug(f">> message = {message.topic}  {message.payload}")
 
-    self.__subscribed_queue.put(message)
+    self._subscribed_queue.put(message)
 
     # set event that message has been received
-    if self.__message_trigger is not None:
-      self.__message_trigger.set()
+    if self._message_trigger is not None:
+      self._message_trigger.set()
 
-  def __on_publish(self, _client, userdata, mid, reason_code, _properties=None):
+  def _on_publish(self, _client, userdata, mid, reason_code, _properties=None):
     """
     Callback: when a message that was to be sent using the publish() call has completed transmission to the broker.
 
@@ -352,10 +459,15 @@ class MQTTClient(threading.Thread):
     Returns:
       None
     """
-    logger.debug(f"userdata={userdata}; mid={mid}; reason_code={reason_code}")
+    if logger.isEnabledFor(logging.DEBUG):
+      logger.debug(f"userdata={userdata}; mid={mid}; reason_code={reason_code}")
+    with self._published_condition:
+      self._mqtt_counter += 1
+      self._published_mid = mid
+      self._published_condition.notify_all()
     return None
 
-  def __on_subscribe_v5(self, _client, _userdata, mid, reason_codes, _properties=None):
+  def _on_subscribe_v5(self, _client, _userdata, mid, reason_codes, _properties=None):
     """
     :param _client: The client instance for this callback
     :param _userdata: The private user data as set in Client() or userdata_set()
@@ -366,12 +478,10 @@ class MQTTClient(threading.Thread):
                       list of Properties class instances.
     :return:
     """
-    logger.debug(f"Subscribed mid variable: {mid}")
-
-    for rc in reason_codes:
-      logger.debug(f"reasonCode = {rc}")
+    if logger.isEnabledFor(logging.DEBUG):
+      logger.debug(f"Subscribed mid variable: {mid}; reasonCodes = {[str(rc) for rc in reason_codes]}")
 
-  def __on_subscribe_v31(self, _client, _userdata, mid, reason_codes, _properties=None):
+  def _on_subscribe_v31(self, _client, _userdata, mid, reason_codes, _properties=None):
     """
     :param _client:
     :param _userdata:
@@ -381,12 +491,10 @@ class MQTTClient(threading.Thread):
     :param _properties: The MQTT v5.0 properties received from the broker.
     :return:
     """
-    logger.debug(f"Subscribed mid variable: {mid}")
-
-    for rc in reason_codes:
-      logger.debug(f"Granted QoS = {rc}")
+    if logger.isEnabledFor(logging.DEBUG):
+      logger.debug(f"Subscribed mid variable: {mid}; granted QoS = {[str(rc) for rc in reason_codes]}")
 
-  def __on_unsubscribe(self, _client, _userdata, mid, reason_codes, _properties=None):
+  def _on_unsubscribe(self, _client, _userdata, mid, reason_codes, _properties=None):
     """
     :param _client:
     :param _userdata:
@@ -398,7 +506,7 @@ class MQTTClient(threading.Thread):
     """
     logger.debug(f">> Unsubscribed: {mid}")
 
-  def __on_log(self, client, _userdata, level, buf):
+  def _on_log(self, client, _userdata, level, buf):
     """
     Callback: when the client has log information.
 
@@ -413,15 +521,26 @@ class MQTTClient(threading.Thread):
     """
     logger.debug(f"obj={client}; level={level}; buf={buf}")
 
-  def __set_status(self):
+  def _resubscribe_all(self):
+    """
+    Subscribe to all stored topics in a single SUBSCRIBE packet
+    Only when connected; otherwise subscribing is done by _on_connect()
+
+    :return: None
+    """
+    if self._connected_flag and self._subscribed_topics:
+      logger.debug(f"Resubscribe topics: {list(self._subscribed_topics)}")
+      self._mqtt.subscribe([(topic, self._qos) for topic in self._subscribed_topics])
+
+  def _set_status(self):
     """
     Publish MQTT status message
     :return: None
     """
     logger.debug(">>")
 
-    if self.__status_topic is not None:
-      self.do_publish(self.__status_topic, self.__status_payload, self.__status_retain)
+    if self._status_topic is not None:
+      self.do_publish(self._status_topic, self._status_payload, self._status_retain)
 
     return
 
@@ -436,10 +555,13 @@ class MQTTClient(threading.Thread):
     :return: None
     """
     logger.debug(">>")
-    self.__status_topic = topic
-    self.__status_payload = payload
-    self.__status_retain = retain
-    self.__set_status()
+    self._status_topic = topic
+    # Encode once; the status is republished on every reconnect
+    if isinstance(payload, str):
+      payload = payload.encode('utf-8')
+    self._status_payload = payload
+    self._status_retain = retain
+    self._set_status()
 
   def will_set(self, topic, payload=None, qos=1, retain=False):
     """
@@ -454,10 +576,10 @@ class MQTTClient(threading.Thread):
     """
     logger.debug(f">>")
 
-    if self.__run:
+    if self._run:
       logger.warning(f"Last Will/testament is set after run() is called. Not advised per documentation")
 
-    self.__mqtt.will_set(topic, payload, qos, retain)
+    self._mqtt.will_set(topic, payload, qos, retain)
 
   def do_publish(self, topic, message, retain=False):
     """
@@ -471,17 +593,97 @@ class MQTTClient(threading.Thread):
     Returns:
       None
     """
-    logger.debug(f">> TOPIC={topic}; MESSAGE={message}")
+    self.do_publish_many(((topic, message, retain),))
+
+  def do_publish_many(self, messages):
+    """
+    Publish multiple topics & messages to MQTT broker in one call
+    eg all topics of a single telegram
+
+    Args:
+      :param iterable messages: (topic, message, retain) tuples
+
+    Returns:
+      None
+    """
+    # Skip formatting the (potentially large) messages when debug logging is disabled
+    debug = logger.isEnabledFor(logging.DEBUG)
+    publish = self._mqtt.publish
+    qos = self._qos
+
+    for topic, message, retain in messages:
+      if debug:
+        logger.debug(f">> TOPIC={topic}; MESSAGE={message}")
+
+      try:
+        mqttmessageinfo = publish(topic=topic, payload=message, qos=qos, retain=retain)
+
+        if mqttmessageinfo.rc == mqtt_client.MQTT_ERR_QUEUE_SIZE:
+          self._mqtt_dropped += 1
+          if not self._queue_full:
+            self._queue_full = True
+            logger.warning(f"MQTT queue is full ({self._max_queued} messages); dropping new messages")
+          continue
+
+        self._queue_full = False
+        self._last_messageinfo = mqttmessageinfo
+
+        if mqttmessageinfo.rc != mqtt_client.MQTT_ERR_SUCCESS:
+          logger.warning(f"MQTT publish was not successfull, rc = {mqttmessageinfo.rc}: "
+                         f"{mqtt_client.error_string(mqttmessageinfo.rc)}")
+      except ValueError:
+        logger.warning("")
+
+  def wait_connected(self, timeout=None):
+    """
+    Block till the client is connected to the MQTT broker, or till timeout
+
+    :param float timeout: timeout in seconds; None blocks till connected
+    :return: True if connected
+    :rtype: bool
+    """
+    return self._connected_event.wait(timeout)
+
+  def wait_queue_empty(self, timeout=None):
+    """
+    Block till the last published message has been sent to the broker, or till timeout
+    Messages are sent in order, so all earlier messages have been sent as well
+
+    :param float timeout: timeout in seconds; None blocks till sent
+    :return: True if all messages have been published
+    :rtype: bool
+    """
+    mqttmessageinfo = self._last_messageinfo
+    if mqttmessageinfo is None:
+      return True
+
+    # Published while not connected; with qos > 0 paho keeps the message and sends it after (re)connecting
+    # The MQTTMessageInfo keeps rc MQTT_ERR_NO_CONN (wait_for_publish raises), so
+    # wait for the connection and then for on_publish of this message
+    if mqttmessageinfo.rc == mqtt_client.MQTT_ERR_NO_CONN and self._qos > 0:
+      deadline = None if timeout is None else time.monotonic() + timeout
+      if not self._connected_event.wait(timeout):
+        logger.warning("No connection with MQTT broker; queued MQTT messages have not been sent")
+        return False
+
+      remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+      with self._published_condition:
+        published = self._published_condition.wait_for(lambda: self._published_mid == mqttmessageinfo.mid,
+                                                        timeout=remaining)
+      if not published:
+        logger.warning("Queued MQTT messages have not all been sent before timeout")
+      return published
 
     try:
-      mqttmessageinfo = self.__mqtt.publish(topic=topic, payload=message, qos=self.__qos, retain=retain)
-      self.__mqtt_counter += 1
+      mqttmessageinfo.wait_for_publish(timeout)
+    except ValueError as e:
+      logger.warning(f"Last MQTT message was dropped; outgoing queue was full: {e}")
+      return False
+    except RuntimeError as e:
+      logger.warning(f"Last MQTT message could not be published: {e}")
+      return False
 
-      if mqttmessageinfo.rc != mqtt_client.MQTT_ERR_SUCCESS:
-        logger.warning(f"MQTT publish was not successfull, rc = {mqttmessageinfo.rc}: "
-                       f"{mqtt_client.error_string(mqttmessageinfo.rc)}")
-    except ValueError:
-      logger.warning("")
+    return mqttmessageinfo.is_published()
 
   def set_message_trigger(self, subscribed_queue, trigger=None):
     """
@@ -489,39 +691,39 @@ class MQTTClient(threading.Thread):
     The received messages are stored in a queue
     If a message is received, trigger event will be set
 
-    :param subscribed_queue: Queue() - as received by on_message (topic, payload,..)
+    :param subscribed_queue: queue.SimpleQueue() or Queue() - as received by on_message (topic, payload,..)
+      SimpleQueue is preferred; put() is called from the paho network thread for every message
+      and SimpleQueue has less locking overhead than Queue
     :param trigger: threading.Event(); OPTIONAL: to indicate that message has been received
     :return:
     """
 
-    self.__message_trigger = trigger
-    self.__subscribed_queue = subscribed_queue
+    self._message_trigger = trigger
+    self._subscribed_queue = subscribed_queue
 
     # Re-subscribe, in case connection was lost
-    for topic in self.__list_of_subscribed_topics:
-      logger.debug(f"Resubscribe topic: {topic}")
-      self.__mqtt.subscribe(topic, self.__qos)
+    self._resubscribe_all()
 
     return
 
   def subscribe(self, topic):
     logger.debug(f">> topic = {topic}")
 
-    # Add to subscribed topic to queue (for resubscribing when reconnecting)
-    self.__list_of_subscribed_topics.append(topic)
+    # Add to subscribed topics (for resubscribing when reconnecting)
+    self._subscribed_topics[topic] = None
 
-    if self.__subscribed_queue is None:
+    if self._subscribed_queue is None:
       logger.error(f"Subscription message queue has not been set --> call set_message_trigger")
       return
 
     # Subscribing will not work if client is not connected
     # Wait till there is a connection
     # Todo....not required....just store in list, will be subscribe in on_connect()
-    # while not self.__connected_flag and not self.__mqtt_stopper.is_set():
+    # while not self._connected_flag and not self._mqtt_stopper.is_set():
     #  logger.warning(f"No connection with MQTT Broker; cannot subscribe...wait for connection")
     #  time.sleep(0.1)
 
-    self.__mqtt.subscribe(topic, self.__qos)
+    self._mqtt.subscribe(topic, self._qos)
     return
 
   def unsubscribe(self, topic):
@@ -534,105 +736,103 @@ class MQTTClient(threading.Thread):
     :return:
     """
     logger.debug(f">> topic = {topic}")
-    self.__mqtt.unsubscribe(topic)
+    self._mqtt.unsubscribe(topic)
 
-    try:
-      self.__list_of_subscribed_topics.remove(topic)
-    except ValueError:
+    if topic in self._subscribed_topics:
+      del self._subscribed_topics[topic]
+    else:
       logger.warning(f"MQTT client was not subscribed to topic '{topic}'; "
                      f"did you use exact same topic as when subscribing?")
     return
 
   def run(self):
-    logger.info(f"Broker = {self.__mqtt_broker}>>")
-    self.__run = True
-
-    # Wait till there is network connectivity to mqtt broker
-    # Start with a small delay and incrementally (+20%) make larger
-    delay = 0.1
-    while not self.__internet_on():
-      time.sleep(delay)
-      delay = delay * 1.2
-
-      # Timeout after 60min
-      if delay > 3600:
-        logger.error(f"No internet connection - EXIT")
-        self.__mqtt_stopper.set()
-        self.__worker_threads_stopper.set()
-        return
+    logger.info(f"Broker = {self._mqtt_broker}>>")
+    self._run = True
+    self._start_time = time.monotonic()
 
+    # No need to wait for network connectivity; the network loop keeps retrying to connect
+    # with an increasing delay (reconnect_delay_set), and reports each failure via on_connect_fail
     try:
       # Options functions to be called before connecting
-      # Set queue to unlimitted (=65535) when qos>0
-      self.__mqtt.max_queued_messages_set(0)
-      self.__mqtt.reconnect_delay_set(min_delay=1, max_delay=360)
+      # Limit the outgoing queue (when qos>0), so memory stays bounded while the broker is unreachable
+      self._mqtt.max_queued_messages_set(self._max_queued)
+      self._mqtt.reconnect_delay_set(min_delay=1, max_delay=360)
 
       # clean_session is only implemented for MQTT v3
-      if self.__mqtt_protocol == mqtt_client.MQTTv311 or self.__mqtt_protocol == mqtt_client.MQTTv31:
-        self.__mqtt.connect_async(host=self.__mqtt_broker,
-                                  port=self.__mqtt_port,
-                                  keepalive=self.__keepalive)
-      elif self.__mqtt_protocol == mqtt_client.MQTTv5:
-        if self.__mqtt_cleansession:
+      if self._is_v3:
+        self._mqtt.connect_async(host=self._mqtt_broker,
+                                 port=self._mqtt_port,
+                                 keepalive=self._keepalive)
+      elif self._mqtt_protocol == mqtt_client.MQTTv5:
+        if self._mqtt_cleansession:
           # TODO
           # For clean_start set to True or Start_first_Only, a session expiry interval
           # has to be set via properties object
           # This is not yet implemented
-          self.__mqtt.connect_async(host=self.__mqtt_broker,
-                                    port=self.__mqtt_port,
-                                    keepalive=self.__keepalive,
-                                    clean_start=mqtt_client.MQTT_CLEAN_START_FIRST_ONLY,
-                                    properties=None)
+          self._mqtt.connect_async(host=self._mqtt_broker,
+                                   port=self._mqtt_port,
+                                   keepalive=self._keepalive,
+                                   clean_start=mqtt_client.MQTT_CLEAN_START_FIRST_ONLY,
+                                   properties=None)
         else:
-          self.__mqtt.connect_async(host=self.__mqtt_broker,
-                                    port=self.__mqtt_port,
-                                    keepalive=self.__keepalive,
-                                    clean_start=False,
-                                    properties=None)
+          self._mqtt.connect_async(host=self._mqtt_broker,
+                                   port=self._mqtt_port,
+                                   keepalive=self._keepalive,
+                                   clean_start=False,
+                                   properties=None)
       else:
-        logger.error(f"Unknown MQTT protocol version {self.__mqtt_protocol}....exit")
-        self.__worker_threads_stopper.set()
-        self.__mqtt_stopper.set()
+        logger.error(f"Unknown MQTT protocol version {self._mqtt_protocol}....exit")
+        self._worker_threads_stopper.set()
+        self._mqtt_stopper.set()
 
     except Exception as e:
       logger.exception(f"Exception {format(e)}")
-      self.__mqtt.disconnect()
-      self.__mqtt_stopper.set()
-      self.__worker_threads_stopper.set()
+      self._mqtt.disconnect()
+      self._mqtt_stopper.set()
+      self._worker_threads_stopper.set()
       return
 
     else:
       logger.info(f"Start mqtt loop...")
-      self.__mqtt.loop_start()
+      self._mqtt.loop_start()
 
-    # Start infinite loop which sends queued messages every second
-    while not self.__mqtt_stopper.is_set():
-      # Todo: reconnect stuff needed?
+    # Start infinite loop which checks the connection status
+    # Block on the stopper, which returns immediately when the client has to stop
+    while True:
+      timeout = self._MQTT_CONNECTION_TIMEOUT
 
       # Check connection status
       # If disconnected time exceeds threshold
       # then reconnect
-      if not self.__connected_flag:
-        disconnect_time = int(time.time()) - self.__disconnect_start_time
-        logger.debug(f"Disconnect TIMER = {disconnect_time}")
-        if disconnect_time > self.__MQTT_CONNECTION_TIMEOUT:
+      # Till the first successful connection, paho's network loop retries itself
+      # (reconnect_delay_set); forcing a reconnect here would add a second retrier
+      if not self._connected_flag and self._connected_once:
+        disconnect_time = time.monotonic() - self._disconnect_start_time
+        logger.debug(f"Disconnect TIMER = {disconnect_time:.0f}")
+        if disconnect_time > self._MQTT_CONNECTION_TIMEOUT:
           try:
-            self.__mqtt.reconnect()
+            self._mqtt.reconnect()
           except Exception as e:
-            logger.exception(f"Exception {format(e)}")
+            logger.warning(f"Reconnect to MQTT broker failed; Exception {format(e)}")
 
-            # reconnect failed....reset disconnect time, and retry after self.__MQTT_CONNECTION_TIMEOUT
-            self.__disconnect_start_time = int(time.time())
+          # Reset disconnect time, and retry after self._MQTT_CONNECTION_TIMEOUT if still disconnected
+          self._disconnect_start_time = time.monotonic()
+        else:
+          # Wake up when the reconnect threshold is reached
+          timeout = self._MQTT_CONNECTION_TIMEOUT - disconnect_time
 
-      time.sleep(0.1)
+      if self._mqtt_stopper.wait(timeout=max(1, timeout)):
+        break
 
     # Close mqtt broker
     logger.debug(f"Close down MQTT client & connection to broker")
-    self.__mqtt.loop_stop()
-    self.__mqtt.disconnect()
-    self.__mqtt_stopper.set()
-    self.__worker_threads_stopper.set()
-
-    logger.info(f"Shutting down MQTT Client... {self.__mqtt_counter} MQTT messages have been published")
+    self._mqtt.loop_stop()
+    self._mqtt.disconnect()
+    self._mqtt_stopper.set()
+    self._worker_threads_stopper.set()
+
+    logger.info(f"Shutting down MQTT Client... {self._mqtt_counter} MQTT messages have been published")
+    if self._mqtt_dropped:
+      logger.warning(f"{self._mqtt_dropped} MQTT messages have been dropped; queue was full")
 
     logger.info(f"<<")